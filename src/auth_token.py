@@ -5,9 +5,49 @@
 提供RSA密钥对生成和访问令牌创建功能
 """
 
+import logging
+import os
+
+from cryptography.hazmat.primitives import serialization
+from pydantic import SecretStr
+
 from fastmcp.server.auth import BearerAuthProvider
 from fastmcp.server.auth.providers.bearer import RSAKeyPair
 
+logger = logging.getLogger(__name__)
+
+
+def load_or_create_key_pair() -> RSAKeyPair:
+    """
+    从磁盘加载RSA密钥对，不存在时生成并持久化
+
+    RSA密钥生成耗时数百毫秒且每次重启换新密钥会使已签发的令牌全部失效，
+    因此将私钥持久化到 AUTH_KEY_PATH（默认 ./mcp_key.pem），只在首次启动时生成。
+    """
+    key_path = os.getenv('AUTH_KEY_PATH', './mcp_key.pem')
+
+    if os.path.exists(key_path):
+        with open(key_path, 'rb') as f:
+            private_key = serialization.load_pem_private_key(f.read(), password=None)
+
+        private_pem = private_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        ).decode()
+        public_pem = private_key.public_key().public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        ).decode()
+        return RSAKeyPair(private_key=SecretStr(private_pem), public_key=public_pem)
+
+    key_pair = RSAKeyPair.generate()
+    # 私钥文件只允许属主读写
+    fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(key_pair.private_key.get_secret_value())
+    return key_pair
+
 
 def create_auth_components():
     """
@@ -16,8 +56,8 @@ def create_auth_components():
     Returns:
         tuple: (access_token, auth_provider)
     """
-    # 生成RSA密钥对
-    key_pair = RSAKeyPair.generate()
+    # 加载（或首次生成）RSA密钥对
+    key_pair = load_or_create_key_pair()
     
     # 创建访问令牌
     access_token = key_pair.create_token(
@@ -27,7 +67,11 @@ def create_auth_components():
         scopes=["data:read_tables", "data:read_table_data"]
     )
     
-    print(f'Authorization=Bearer {access_token}')
+    # 访问令牌默认不落到stdout，调试时通过环境变量显式开启
+    if os.getenv('MCP_DEBUG_PRINT_TOKEN'):
+        print(f'Authorization=Bearer {access_token}')
+    else:
+        logger.debug('Authorization=Bearer %s', access_token)
 
     # 创建认证提供者
     auth = BearerAuthProvider(
@@ -1,156 +1,295 @@
+import logging
 import os
-import mysql.connector
+import re
+import time
+from mysql.connector import pooling
+from mysql.connector.constants import ClientFlag
+from mysql.connector.conversion import MySQLConverter
 from typing import Optional, Dict, Any, List
 from dotenv import load_dotenv
 
 # 加载环境变量
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# 合法表名：表名无法作为预处理语句的参数占位，拼接前必须先通过白名单校验
+_TABLE_NAME_RE = re.compile(r'^[A-Za-z0-9_]+$')
+
+class JSONSafeConverter(MySQLConverter):
+    """在驱动转换层直接产出JSON可序列化的值，省去Python侧逐行逐列的后处理"""
+
+    def _DATETIME_to_python(self, value, dsc=None):
+        dt = super()._DATETIME_to_python(value, dsc)
+        return dt.isoformat() if dt is not None else None
+
+    _TIMESTAMP_to_python = _DATETIME_to_python
+
+    def _DATE_to_python(self, value, dsc=None):
+        d = super()._DATE_to_python(value, dsc)
+        return d.isoformat() if d is not None else None
+
+    def _TIME_to_python(self, value, dsc=None):
+        t = super()._TIME_to_python(value, dsc)
+        return str(t) if t is not None else None
+
+    def _DECIMAL_to_python(self, value, dsc=None):
+        dec = super()._DECIMAL_to_python(value, dsc)
+        return str(dec) if dec is not None else None
+
+    _NEWDECIMAL_to_python = _DECIMAL_to_python
+
+    def _STRING_to_python(self, value, dsc=None):
+        result = super()._STRING_to_python(value, dsc)
+        if isinstance(result, (bytes, bytearray)):
+            return result.decode('utf-8', errors='ignore')
+        return result
+
+    _VAR_STRING_to_python = _STRING_to_python
+
+    def _BLOB_to_python(self, value, dsc=None):
+        result = super()._BLOB_to_python(value, dsc)
+        if isinstance(result, (bytes, bytearray)):
+            return result.decode('utf-8', errors='ignore')
+        return result
+
+
 class DatabaseManager:
-    """数据库管理类，负责MySQL数据库的连接和查询"""
-    
+    """数据库管理类，负责MySQL连接池的管理和查询"""
+
     def __init__(self):
         self.host = os.getenv('DB_HOST', 'localhost')
         self.port = int(os.getenv('DB_PORT', 3306))
         self.user = os.getenv('DB_USER')
         self.password = os.getenv('DB_PASSWORD')
         self.database = os.getenv('DB_NAME')
-        self.connection = None
-        
-    def connect(self) -> bool:
-        """建立数据库连接"""
+        self.pool_size = int(os.getenv('DB_POOL_SIZE', 25))
+
+        # 表元数据缓存（表结构/样本/行数变化很少，避免重复的目录查询）
+        self._meta_cache: Dict[str, tuple] = {}
+        self._meta_ttl = int(os.getenv('META_TTL', 300))
+
+        connect_kwargs = dict(
+            host=self.host,
+            port=self.port,
+            user=self.user,
+            password=self.password,
+            database=self.database,
+            charset='utf8mb4',
+            autocommit=True,
+            # limit截断可能留下未读取的行，关闭游标时自动消费掉，
+            # 避免InternalError("Unread result found")污染归还的连接
+            consume_results=True,
+            # C扩展不支持自定义converter_class，自定义转换需要纯Python协议实现
+            use_pure=True,
+            converter_class=JSONSafeConverter
+        )
+
+        # 创建连接池，避免单连接在并发工具调用下成为瓶颈。
+        # 用户SQL所走的主池不开启MULTI_STATEMENTS，堆叠语句在协议层就无法执行
+        self._pool = pooling.MySQLConnectionPool(
+            pool_name="mcp",
+            pool_size=self.pool_size,
+            **connect_kwargs
+        )
+
+        # 仅供execute_multi（内部元数据查询）使用的小连接池，单独开启多语句标志
+        self._multi_pool = pooling.MySQLConnectionPool(
+            pool_name="mcp_multi",
+            pool_size=int(os.getenv('DB_META_POOL_SIZE', 2)),
+            client_flags=[ClientFlag.MULTI_STATEMENTS],
+            **connect_kwargs
+        )
+
+        logger.info("已创建数据库连接池: %s (大小: %d)", self.database, self.pool_size)
+
+    def execute_query(self, query: str, limit: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """执行SQL查询，返回 {'columns': 列名列表, 'rows': 元组行列表}
+
+        列名只构造一次，行保持元组形式，宽结果集下省去每行的字典分配。
+        limit限制从服务器拉取的最大行数。
+        """
         try:
-            self.connection = mysql.connector.connect(
-                host=self.host,
-                port=self.port,
-                user=self.user,
-                password=self.password,
-                database=self.database,
-                charset='utf8mb4'
-            )
-            
-            print("✅ 成功连接到数据库: {}".format(self.database))
-            return True
-            
+            # 从连接池获取连接，用完归还
+            connection = self._pool.get_connection()
+            try:
+                cursor = connection.cursor()
+                cursor.arraysize = 1000
+                cursor.execute(query)
+                columns = list(cursor.column_names)
+
+                # 分批拉取结果，达到limit即停止，避免大结果集一次性驻留内存
+                if limit is None:
+                    rows = cursor.fetchall()
+                else:
+                    rows = []
+                    while len(rows) < limit:
+                        batch = cursor.fetchmany(min(1000, limit - len(rows)))
+                        if not batch:
+                            break
+                        rows.extend(batch)
+                cursor.close()
+            finally:
+                # close() 将连接归还到连接池
+                connection.close()
+
+            logger.debug("查询成功，返回 %d 行数据", len(rows))
+            return {'columns': columns, 'rows': rows}
+
         except Exception as e:
-            print("❌ 数据库连接失败: {}".format(str(e)))
-            return False
-    
-    def execute_query(self, query: str) -> Optional[List[Dict[str, Any]]]:
-        """执行SQL查询并返回字典列表"""
+            logger.error("查询执行失败: %s", e, exc_info=True)
+            return None
+
+    def _execute_prepared(self, query: str, params: tuple) -> Optional[List[tuple]]:
+        """用服务端预处理语句执行参数化查询，重复调用可跳过服务端解析"""
         try:
-            if not self.connection:
-                print("❌ 数据库未连接")
-                return None
-            
-            cursor = self.connection.cursor(dictionary=True)
-            cursor.execute(query)
-            
-            # 获取查询结果
-            results = cursor.fetchall()
-            cursor.close()
-            
-            if results:
-                # 转换数据类型
-                converted_results = [self._convert_row_types(row) for row in results]
-                print("✅ 查询成功，返回 {} 行数据".format(len(converted_results)))
-                return converted_results
-            else:
-                print("✅ 查询成功，但没有返回数据")
-                return []
-            
+            connection = self._pool.get_connection()
+            try:
+                cursor = connection.cursor(prepared=True)
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+                cursor.close()
+            finally:
+                connection.close()
+            return rows
+
+        except Exception as e:
+            logger.error("预处理查询执行失败: %s", e, exc_info=True)
+            return None
+
+    def execute_multi(self, queries: List[str]) -> Optional[List[List[Dict[str, Any]]]]:
+        """在一次往返中执行多条SQL，按顺序返回各语句的结果集
+
+        仅限内部元数据查询使用：走单独开启了MULTI_STATEMENTS的连接池，
+        不要把用户输入的SQL传进来。
+        """
+        try:
+            connection = self._multi_pool.get_connection()
+            try:
+                cursor = connection.cursor(dictionary=True)
+                result_sets = []
+                for result in cursor.execute("; ".join(queries), multi=True):
+                    result_sets.append(result.fetchall() if result.with_rows else [])
+                cursor.close()
+            finally:
+                connection.close()
+            return result_sets
+
         except Exception as e:
-            print("❌ 查询执行失败: {}".format(str(e)))
+            logger.error("批量查询执行失败: %s", e, exc_info=True)
             return None
-    
-    def _convert_row_types(self, row: Dict[str, Any]) -> Dict[str, Any]:
-        """转换行数据中的特殊类型为JSON可序列化的类型"""
-        converted = {}
-        for key, value in row.items():
-            if value is None:
-                converted[key] = None
-            elif isinstance(value, (int, float, str, bool)):
-                converted[key] = value
-            elif hasattr(value, 'isoformat'):  # datetime objects
-                converted[key] = value.isoformat()
-            elif isinstance(value, bytes):
-                converted[key] = value.decode('utf-8', errors='ignore')
-            else:
-                converted[key] = str(value)
-        return converted
-    
+
+    def _cache_get(self, key: str) -> Optional[Any]:
+        """从元数据缓存读取，过期条目返回None"""
+        entry = self._meta_cache.get(key)
+        if entry is None:
+            return None
+        ts, value = entry
+        if time.monotonic() - ts > self._meta_ttl:
+            del self._meta_cache[key]
+            return None
+        return value
+
+    def _cache_set(self, key: str, value: Any) -> None:
+        """写入元数据缓存"""
+        self._meta_cache[key] = (time.monotonic(), value)
+
+    def invalidate(self, table_name: Optional[str] = None) -> None:
+        """使元数据缓存失效，不传表名则清空全部缓存"""
+        if table_name is None:
+            self._meta_cache.clear()
+        else:
+            self._meta_cache.pop(table_name, None)
+            self._meta_cache.pop('__rows__:' + table_name, None)
+            self._meta_cache.pop('__tables__', None)
+
     def get_table_info(self, table_name: str) -> Dict[str, Any]:
-        """获取表结构信息"""
+        """获取表结构信息（带TTL缓存）"""
+        if not _TABLE_NAME_RE.match(table_name):
+            logger.error("非法表名: %s", table_name)
+            return {}
+
+        cached = self._cache_get(table_name)
+        if cached is not None:
+            return cached
+
         try:
-            # 获取表结构
-            structure_query = f"DESCRIBE {table_name}"
-            structure_data = self.execute_query(structure_query)
-            
-            # 获取表数据样本
-            sample_query = f"SELECT * FROM {table_name} LIMIT 5"
-            sample_data = self.execute_query(sample_query)
-            
-            # 获取表统计信息
-            count_query = f"SELECT COUNT(*) as total_rows FROM {table_name}"
-            count_data = self.execute_query(count_query)
-            
-            total_rows = count_data[0]['total_rows'] if count_data and len(count_data) > 0 else 0
-            
-            return {
+            # 表结构和样本数据合并为一次往返（表名已通过白名单校验）
+            result_sets = self.execute_multi([
+                f"DESCRIBE `{table_name}`",
+                f"SELECT * FROM `{table_name}` LIMIT 5"
+            ])
+
+            if result_sets is None or len(result_sets) != 2:
+                return {}
+
+            structure_data, sample_data = result_sets
+
+            # 近似行数优先读取get_all_tables预热的缓存，未命中时走参数化的预处理语句
+            # （information_schema的TABLE_ROWS是近似值，但避免了大表上的全表COUNT(*)）
+            total_rows = self._cache_get('__rows__:' + table_name)
+            if total_rows is None:
+                count_rows = self._execute_prepared(
+                    "SELECT TABLE_ROWS FROM information_schema.TABLES "
+                    "WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s",
+                    (self.database, table_name)
+                )
+                total_rows = count_rows[0][0] if count_rows else 0
+
+            table_info = {
                 'structure': structure_data,
                 'sample_data': sample_data,
-                'total_rows': total_rows
+                'total_rows': total_rows or 0
             }
-            
+            self._cache_set(table_name, table_info)
+            return table_info
+
         except Exception as e:
-            print("❌ 获取表信息失败: {}".format(str(e)))
+            logger.error("获取表信息失败: %s", e, exc_info=True)
             return {}
-    
+
     def get_all_tables(self) -> List[str]:
-        """获取数据库中所有表名"""
+        """获取数据库中所有表名（带TTL缓存）"""
+        cached = self._cache_get('__tables__')
+        if cached is not None:
+            return cached
+
         try:
-            query = "SHOW TABLES"
-            results = self.execute_query(query)
-            if results:
-                # 提取表名（通常是结果中的第一个字段）
-                table_names = [list(row.values())[0] for row in results]
+            # 一次查询同时取回表名和近似行数，顺便为get_table_info预热行数缓存
+            rows = self._execute_prepared(
+                "SELECT TABLE_NAME, TABLE_ROWS FROM information_schema.TABLES "
+                "WHERE TABLE_SCHEMA = %s",
+                (self.database,)
+            )
+            if rows:
+                table_names = [name for name, _ in rows]
+                for name, approx_rows in rows:
+                    self._cache_set('__rows__:' + name, approx_rows or 0)
+                self._cache_set('__tables__', table_names)
                 return table_names
             return []
         except Exception as e:
-            print("❌ 获取表列表失败: {}".format(str(e)))
+            logger.error("获取表列表失败: %s", e, exc_info=True)
             return []
-    
-    def close(self):
-        """关闭数据库连接"""
-        if self.connection:
-            self.connection.close()
-            print("✅ 数据库连接已关闭")
-    
-    def __enter__(self):
-        self.connect()
-        return self
-    
-    def __exit__(self, exc_type, exc_val, exc_tb):
-        self.close()
 
 # 示例用法
 if __name__ == "__main__":
-    # 使用上下文管理器
-    with DatabaseManager() as db:
-        # 获取所有表
-        tables = db.get_all_tables()
-        print(f"数据库中的表: {tables}")
-        
-        # 如果有表，获取第一个表的信息
-        if tables:
-            table_info = db.get_table_info(tables[0])
-            print(f"\n表 {tables[0]} 的信息:")
-            print(f"总行数: {table_info.get('total_rows', 0)}")
-            if 'structure' in table_info:
-                print("\n表结构:")
-                for row in table_info['structure']:
-                    print(row)
-            if 'sample_data' in table_info:
-                print("\n样本数据:")
-                for row in table_info['sample_data']:
-                    print(row)
\ No newline at end of file
+    db = DatabaseManager()
+
+    # 获取所有表
+    tables = db.get_all_tables()
+    print(f"数据库中的表: {tables}")
+
+    # 如果有表，获取第一个表的信息
+    if tables:
+        table_info = db.get_table_info(tables[0])
+        print(f"\n表 {tables[0]} 的信息:")
+        print(f"总行数: {table_info.get('total_rows', 0)}")
+        if 'structure' in table_info:
+            print("\n表结构:")
+            for row in table_info['structure']:
+                print(row)
+        if 'sample_data' in table_info:
+            print("\n样本数据:")
+            for row in table_info['sample_data']:
+                print(row)
@@ -5,7 +5,11 @@ MCP数据查询服务器
 基于FastMCP框架，提供安全的数据库查询服务
 """
 
+import asyncio
+import functools
+import logging
 import os
+import re
 from typing import Dict, Any
 from fastmcp import FastMCP, Context
 from fastmcp.exceptions import ToolError
@@ -19,22 +23,162 @@ from auth_token import create_auth_components
 # 加载环境变量
 load_dotenv()
 
-# 全局数据库管理器实例
-db_manager = None
+logger = logging.getLogger(__name__)
+
+# 关键词集合只在模块级定义一次，正则和自动机都从这里派生
+_DANGEROUS_KEYWORDS = frozenset(('drop', 'delete', 'update', 'insert', 'alter', 'create', 'truncate'))
+_SENSITIVE_KEYWORDS = frozenset(('password', 'secret', 'token', 'private', 'confidential'))
+
+_KEYWORD_CLASSES = (
+    (_DANGEROUS_KEYWORDS, 'danger'),
+    (_SENSITIVE_KEYWORDS, 'sensitive'),
+)
+
+# 模块级预编译的SQL安全检查正则：单次扫描替代多次子串搜索，
+# 词边界锚定避免 updated_at 之类的列名误触发
+_DANGEROUS_RE = re.compile(r'\b(?:' + '|'.join(_DANGEROUS_KEYWORDS) + r')\b', re.I)
+_SENSITIVE_RE = re.compile(r'\b(?:' + '|'.join(_SENSITIVE_KEYWORDS) + r')\b', re.I)
+_HAS_LIMIT_RE = re.compile(r'\blimit\b', re.I)
+
+# AST级的SQL校验与LIMIT改写：按语句类型拒绝写操作比子串匹配可靠，
+# 也能正确钳制已有的LIMIT子句；未安装sqlglot时回退到关键词检查+字符串追加
+try:
+    import sqlglot
+    from sqlglot import exp
+
+    # 兼容不同sqlglot版本的节点命名（AlterTable在新版本中更名为Alter）
+    _WRITE_NODES = tuple(
+        node for node in (
+            getattr(exp, name, None)
+            for name in ('Delete', 'Update', 'Insert', 'Drop', 'Alter',
+                         'AlterTable', 'Create', 'TruncateTable')
+        ) if node is not None
+    )
+
+    # 只读白名单：仅这些根节点类型放行，REPLACE/RENAME/CALL/GRANT/SET/KILL等
+    # 会被sqlglot归为Command或其他根类型，统一拒绝而无需逐一枚举
+    _READ_ROOTS = tuple(
+        node for node in (
+            getattr(exp, name, None)
+            for name in ('Select', 'Union', 'Intersect', 'Except',
+                         'Show', 'Describe')
+        ) if node is not None
+    )
+except ImportError:
+    sqlglot = None
+
+# 单遍多模式匹配：pyahocorasick（C扩展）一次遍历同时判定所有关键词类别，
+# 未安装时回退到上面的预编译正则（每个类别各扫描一遍）
+try:
+    import ahocorasick
+
+    _KEYWORD_AUTOMATON = ahocorasick.Automaton()
+    for _keywords, _label in _KEYWORD_CLASSES:
+        for _kw in _keywords:
+            _KEYWORD_AUTOMATON.add_word(_kw, (_kw, _label))
+    _KEYWORD_AUTOMATON.make_automaton()
+except ImportError:
+    _KEYWORD_AUTOMATON = None
+
+
+@functools.lru_cache(maxsize=1024)
+def _rewrite_sql_ast(sql_query: str, limit: int) -> str:
+    """解析SQL，拒绝写操作并注入/钳制LIMIT，返回改写后的SQL
+
+    相同的原始SQL会命中lru_cache，跳过重复解析。
+    """
+    tree = sqlglot.parse_one(sql_query, read='mysql')
+
+    # (SELECT ...) 这类带外层括号的查询根节点是Subquery，先剥掉括号
+    while isinstance(tree, exp.Subquery) and tree.this is not None:
+        tree = tree.this
 
-# 创建认证组件
-auth = create_auth_components()
+    # 写操作按节点类型拒绝
+    if tree.find(*_WRITE_NODES):
+        raise ToolError("安全限制：不允许执行修改数据的操作")
 
-mcp = FastMCP(name="data-analysis-mcp", auth=auth)
+    # sqlglot把无法识别的语法包成Command而不是抛异常；
+    # 非读语句根节点按解析失败处理，避免把语法错误误报成写操作
+    if not isinstance(tree, _READ_ROOTS):
+        raise ToolError("无法解析的SQL语句，请检查语法或确认为只读查询")
+
+    if isinstance(tree, exp.Select):
+        existing = tree.args.get('limit')
+        if existing is None:
+            tree = tree.limit(limit)
+        else:
+            # 已有LIMIT超出上限时向下钳制
+            try:
+                if int(existing.expression.name) > limit:
+                    tree = tree.limit(limit)
+            except (AttributeError, ValueError):
+                pass
+
+    return tree.sql(dialect='mysql')
+
+
+def _validate_and_limit(sql_query: str, limit: int, danger: bool) -> str:
+    """校验查询并保证LIMIT不超过上限，写操作抛出ToolError"""
+    if sqlglot is not None:
+        try:
+            return _rewrite_sql_ast(sql_query, limit)
+        except ToolError:
+            raise
+        except Exception:
+            logger.debug("SQL解析失败，回退到关键词检查: %s", sql_query)
+
+    if danger:
+        raise ToolError("安全限制：不允许执行修改数据的操作")
+    if _HAS_LIMIT_RE.search(sql_query):
+        return sql_query
+    return f"{sql_query.rstrip(';')} LIMIT {limit}"
 
-def initialize_services():
-    """初始化服务"""
-    global db_manager
 
-    if db_manager is None:
-        db_manager = DatabaseManager()
-        if not db_manager.connect():
-            raise Exception("数据库连接失败")
+def _classify_sql(sql_query: str) -> Dict[str, bool]:
+    """对查询做一次线性扫描，返回 {'danger': bool, 'sensitive': bool}"""
+    if _KEYWORD_AUTOMATON is None:
+        return {
+            'danger': _DANGEROUS_RE.search(sql_query) is not None,
+            'sensitive': _SENSITIVE_RE.search(sql_query) is not None,
+        }
+
+    flags = {'danger': False, 'sensitive': False}
+    sql_lc = sql_query.casefold()
+    for end, (keyword, label) in _KEYWORD_AUTOMATON.iter(sql_lc):
+        # 自动机按子串匹配，这里补上词边界检查，保持与正则版本一致的语义
+        start = end - len(keyword) + 1
+        before = sql_lc[start - 1] if start > 0 else ''
+        after = sql_lc[end + 1] if end + 1 < len(sql_lc) else ''
+        if before.isalnum() or before == '_' or after.isalnum() or after == '_':
+            continue
+        flags[label] = True
+        if flags['danger'] and flags['sensitive']:
+            break
+    return flags
+
+# 工具返回值用orjson（C实现）序列化，大结果集的JSON编码比标准json快数倍；
+# 未安装时传None让FastMCP走默认序列化
+try:
+    import orjson
+
+    def _serialize_tool_result(data: Any) -> str:
+        return orjson.dumps(
+            data,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        ).decode()
+except ImportError:
+    _serialize_tool_result = None
+
+# 认证组件只创建一次（RSA密钥加载/令牌签发），缓存后多次调用为空操作
+get_auth = functools.cache(create_auth_components)
+
+mcp = FastMCP(name="data-analysis-mcp", auth=get_auth(), tool_serializer=_serialize_tool_result)
+
+
+@functools.cache
+def get_db() -> DatabaseManager:
+    """懒初始化数据库管理器，首次调用时才建立连接池"""
+    return DatabaseManager()
 
 
 def get_validated_access_token() -> AccessToken:
@@ -50,10 +194,12 @@ def get_validated_access_token() -> AccessToken:
 
 def check_permissions(access_token: AccessToken, required_scopes: list) -> None:
     """检查权限"""
-    if not access_token.scopes:
+    # scopes可能是列表，先转为集合，成员判断从线性扫描变为哈希查找
+    have_scopes = frozenset(access_token.scopes or ())
+    if not have_scopes:
         raise ToolError("用户没有任何权限")
 
-    missing_scopes = [scope for scope in required_scopes if scope not in access_token.scopes]
+    missing_scopes = [scope for scope in required_scopes if scope not in have_scopes]
     if missing_scopes:
         raise ToolError(f"权限不足：需要以下权限: {', '.join(missing_scopes)}")
 
@@ -69,8 +215,9 @@ async def get_database_tables(ctx: Context) -> Dict[str, Any]:
     check_permissions(access_token, ["data:read_tables"])
 
     try:
-        initialize_services()
-        tables = db_manager.get_all_tables()
+        # 阻塞的数据库调用放到工作线程，避免卡住事件循环
+        db = await asyncio.to_thread(get_db)
+        tables = await asyncio.to_thread(db.get_all_tables)
 
         return {
             "user_id": access_token.client_id,
@@ -95,8 +242,8 @@ async def get_table_structure(ctx: Context, table_name: str) -> Dict[str, Any]:
     check_permissions(access_token, ["data:read_tables"])
 
     try:
-        initialize_services()
-        table_info = db_manager.get_table_info(table_name)
+        db = await asyncio.to_thread(get_db)
+        table_info = await asyncio.to_thread(db.get_table_info, table_name)
 
         if not table_info:
             raise ToolError(f"表 '{table_name}' 不存在或无法访问")
@@ -130,40 +277,33 @@ async def execute_sql_query(ctx: Context, sql_query: str, limit: int = 100) -> D
     access_token = get_validated_access_token()
     check_permissions(access_token, ["data:read_table_data"])
 
-    # 检查是否为敏感查询（包含特定关键词）
-    sensitive_keywords = ['password', 'secret', 'token', 'private', 'confidential']
-    is_sensitive = any(keyword in sql_query.lower() for keyword in sensitive_keywords)
+    # 单遍扫描同时完成敏感/危险关键词检查
+    flags = _classify_sql(sql_query)
 
-    if is_sensitive:
+    # 检查是否为敏感查询（包含特定关键词）
+    if flags['sensitive']:
         check_permissions(access_token, ["data:read_table_data"])
 
-    # 安全检查：禁止危险操作
-    dangerous_keywords = ['drop', 'delete', 'update', 'insert', 'alter', 'create', 'truncate']
-    if any(keyword in sql_query.lower() for keyword in dangerous_keywords):
-        raise ToolError("安全限制：不允许执行修改数据的操作")
+    # 安全检查：拒绝写操作，并注入/钳制LIMIT（sqlglot可用时走AST改写）
+    sql_query = _validate_and_limit(sql_query, limit, danger=flags['danger'])
 
     try:
-        initialize_services()
-
-        # 添加LIMIT限制
-        if 'limit' not in sql_query.lower():
-            sql_query = f"{sql_query.rstrip(';')} LIMIT {limit}"
+        db = await asyncio.to_thread(get_db)
 
-        result_data = db_manager.execute_query(sql_query)
+        result = await asyncio.to_thread(db.execute_query, sql_query, limit=limit)
 
-        if result_data is None:
+        if result is None:
             raise ToolError("查询执行失败")
 
-        # 获取列名（如果有数据的话）
-        columns = list(result_data[0].keys()) if result_data else []
+        rows = result['rows']
 
         return {
             "user_id": access_token.client_id,
             "query": sql_query,
-            "row_count": len(result_data),
-            "columns": columns,
-            "data": result_data,
-            "message": f"查询成功，返回 {len(result_data)} 行数据"
+            "row_count": len(rows),
+            "columns": result['columns'],
+            "data": rows,
+            "message": f"查询成功，返回 {len(rows)} 行数据"
         }
 
     except Exception as e:
@@ -177,9 +317,8 @@ async def get_user_permissions(ctx: Context) -> dict:
     无需特殊权限，但需要有效的访问令牌
     """
     try:
-        print(ctx)
         access_token: AccessToken = get_access_token()
-        print(f'access_token: {access_token}')
+        logger.debug('access_token: %s', access_token)
         # 如果没有访问令牌，返回默认信息
         if access_token is None:
             return {
@@ -222,10 +361,10 @@ async def health_check(ctx: Context) -> Dict[str, Any]:
     无需任何权限
     """
     try:
-        initialize_services()
+        await asyncio.to_thread(get_db)
         return {
             "status": "healthy",
-            "database_connected": db_manager is not None,
+            "database_connected": True,
             "message": "服务运行正常"
         }
     except Exception as e:
@@ -238,6 +377,7 @@ async def health_check(ctx: Context) -> Dict[str, Any]:
 
 if __name__ == "__main__":
     # 从环境变量获取配置
+    logging.basicConfig(level=os.getenv('LOG_LEVEL', 'INFO').upper())
     host = os.getenv('MCP_HOST', '127.0.0.1')
     port = int(os.getenv('MCP_PORT', 8000))
 